@@ -102,10 +102,13 @@ class SentimentAnalysisRNN(object):
         - grads: Dictionary of gradients parallel to self.params
         """
 
-        # Assume the initial hidden state is a zero vector
+        # Assume the initial hidden state is a zero vector, in the dtype of the
+        # parameters. Cast wordvecs and mask to self.dtype too, as rnn.py does:
+        # both are integers, and would otherwise promote every matrix multiply
+        # and the masked concatenation to float64.
         N, T, V = wordvecs.shape
         H = self.params['Wh'].shape[0]
-        h0 = np.zeros((N, H))
+        h0 = np.zeros((N, H), dtype=self.dtype)
 
         # Input-to-hidden, hidden-to-hidden, and biases for normal RNN
         Wx, Wh, b = self.params['Wx'], self.params['Wh'], self.params['b']
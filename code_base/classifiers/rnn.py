@@ -93,10 +93,14 @@ class SentimentAnalysisRNN(object):
         - grads: Dictionary of gradients parallel to self.params
         """
 
-        # Assume the initial hidden state is a zero vector
+        # Assume the initial hidden state is a zero vector. Keep the inputs in
+        # the dtype of the parameters: the one-hot word vectors and the mask are
+        # integers, and the mask would promote the average to float64.
         N, T, V = wordvecs.shape
         H = self.params['Wh'].shape[0]
-        h0 = np.zeros((N, H))
+        h0 = np.zeros((N, H), dtype=self.dtype)
+        wordvecs = wordvecs.astype(self.dtype)
+        mask = mask.astype(self.dtype)
 
         # Input-to-hidden, hidden-to-hidden, and biases for normal RNN
         Wx, Wh, b = self.params['Wx'], self.params['Wh'], self.params['b']
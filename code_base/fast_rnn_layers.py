@@ -0,0 +1,250 @@
+from __future__ import print_function, division
+from builtins import range
+import warnings
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+try:
+    import cupy as cp
+except ImportError:
+    cp = None
+
+try:
+    from code_base.rnn_scan_cython import rnn_scan_forward
+except ImportError:
+    rnn_scan_forward = None
+
+from code_base.rnn_layers import rnn_forward, rnn_backward
+
+
+"""
+This file defines alternative versions of the recurrent layers in
+rnn_layers.py. They take the same inputs and produce the same outputs as their
+reference implementations, but rely on optional packages that have to be
+installed separately. Each one is only faster in the setting its docstring
+describes; at the batch and hidden sizes of the sentiment models the numpy
+layers are as fast or faster.
+"""
+
+
+if njit is not None:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _rnn_scan_backward(dh, dtanh_coef, Wh_T, dxw):
+        N, T, H = dh.shape
+        dprev_h = np.zeros((N, H), dxw.dtype)
+        de_dz = np.empty((N, H), dxw.dtype)
+        for t in range(T - 1, -1, -1):
+            for i in prange(N):
+                for j in range(H):
+                    de_dz[i, j] = (dh[i, t, j] + dprev_h[i, j]) * \
+                        dtanh_coef[i, t, j]
+                    dxw[i, t, j] = de_dz[i, j]
+            np.dot(de_dz, Wh_T, dprev_h)
+        return dprev_h
+
+
+def rnn_backward_numba(dh, cache):
+    """
+    An implementation of rnn_backward that runs the timestep loop as a compiled
+    numba kernel. Takes the cache of rnn_forward or rnn_forward_cython and
+    returns dx, dh0, dWx, dWh and db like rnn_backward. It is faster for small
+    batches and hidden sizes; at N=100, H=128 the weight gradients dominate and
+    it runs at the same speed as rnn_backward.
+
+    There is no numba forward pass: numba's scalar tanh is far slower than
+    numpy's vectorized one, which dominates the forward recurrence.
+    """
+    if njit is None:
+        raise ImportError('rnn_backward_numba requires numba; run "pip install numba"')
+    x, prev_h = cache['x'], cache['prev_h']
+    dtanh_coef, Wx, Wh = cache['dtanh_coef'], cache['Wx'], cache['Wh']
+    N, T, H = dh.shape
+    D = x.shape[2]
+    dtype = np.result_type(dh, dtanh_coef)
+    dxw = np.empty((N, T, H), dtype=dtype)
+    dh0 = _rnn_scan_backward(np.ascontiguousarray(dh, dtype=dtype),
+                             np.ascontiguousarray(dtanh_coef, dtype=dtype),
+                             np.ascontiguousarray(Wh.T, dtype=dtype), dxw)
+    dxw = dxw.reshape(N * T, H)
+    dx = np.dot(dxw, Wx.T).reshape(N, T, D)
+    dWx = np.dot(x.reshape(N * T, D).T, dxw)
+    dWh = np.dot(prev_h.reshape(N * T, H).T, dxw)
+    db = np.sum(dxw, axis=0)
+    return dx, dh0, dWx, dWh, db
+
+
+def rnn_forward_cython(x, h0, Wx, Wh, b):
+    """
+    An implementation of rnn_forward that runs the timestep loop in the
+    compiled rnn_scan_cython extension, which calls BLAS directly and releases
+    the GIL. Returns the same hidden states and cache as rnn_forward, so the
+    cache can be passed to rnn_backward.
+
+    It is faster than rnn_forward for small batches and hidden sizes, where the
+    per-step overhead of numpy dominates, e.g. N=4, H=16. At the sizes of the
+    sentiment models, N=100 and H=128, it is slower: numpy's tanh uses wider
+    vector instructions than the compiled loop.
+    """
+    if rnn_scan_forward is None:
+        raise ImportError('rnn_forward_cython requires the compiled extension; '
+                          'run "pip install cython scipy" and "python setup.py '
+                          'build_ext --inplace" from the code_base directory')
+    N, T, D = x.shape
+    H = h0.shape[1]
+    x = np.ascontiguousarray(x)
+    xw = np.dot(x.reshape(N * T, D), Wx).reshape(N, T, H) + b
+    dtype = np.result_type(xw, h0, Wh)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError('rnn_forward_cython only supports float32 and float64')
+    Wh = np.ascontiguousarray(Wh, dtype=dtype)
+    h = np.empty((N, T, H), dtype=dtype)
+    rnn_scan_forward(np.ascontiguousarray(xw, dtype=dtype),
+                     np.ascontiguousarray(h0, dtype=dtype), Wh, h)
+    dtanh_coef = np.square(h)
+    np.subtract(1, dtanh_coef, out=dtanh_coef)
+    prev_h = np.concatenate((h0[:, None, :], h[:, :-1, :]), axis=1)
+    cache = {}
+    cache['x'] = x
+    cache['prev_h'] = prev_h
+    cache['dtanh_coef'] = dtanh_coef
+    cache['Wx'] = Wx
+    cache['Wh'] = Wh
+    return h, cache
+
+
+if cp is not None:
+
+    # One launch per timestep: each block copies prev_h for its sample into
+    # shared memory and each thread produces one entry of the next hidden state.
+    _rnn_step_forward_kernel = cp.RawKernel(r'''
+    __device__ __forceinline__ float fast_tanhf(float x) {
+        float y;
+        asm("tanh.approx.f32 %0, %1;" : "=f"(y) : "f"(x));
+        return y;
+    }
+
+    extern "C" __global__
+    void rnn_step_forward(const float* __restrict__ xw,
+                          const float* __restrict__ h0,
+                          const float* __restrict__ Wh,
+                          float* __restrict__ h,
+                          int N, int T, int H, int t) {
+        extern __shared__ float prev_h[];
+        int n = blockIdx.y;
+        int j = blockIdx.x * blockDim.x + threadIdx.x;
+        const float* src = (t == 0) ? h0 + n * H : h + (n * T + t - 1) * H;
+        for (int k = threadIdx.x; k < H; k += blockDim.x) {
+            prev_h[k] = src[k];
+        }
+        __syncthreads();
+        if (j >= H) {
+            return;
+        }
+        float acc = xw[(n * T + t) * H + j];
+        for (int k = 0; k < H; ++k) {
+            acc += prev_h[k] * Wh[k * H + j];
+        }
+        h[(n * T + t) * H + j] = fast_tanhf(acc);
+    }
+    ''', 'rnn_step_forward')
+
+
+def rnn_forward_cuda(x, h0, Wx, Wh, b):
+    """
+    A fast implementation of rnn_forward for float32 cupy arrays on the GPU.
+    The input projection is a single cuBLAS matrix multiply, and every timestep
+    is one fused kernel launch computing tanh(xw + prev_h.dot(Wh)). Returns the
+    hidden states as a cupy array; the cache is only meant for inference and
+    there is no matching backward pass.
+    """
+    if cp is None:
+        raise ImportError('rnn_forward_cuda requires cupy; run "pip install cupy"')
+    x, h0, Wx, Wh, b = [cp.asarray(a) for a in (x, h0, Wx, Wh, b)]
+    if any(a.dtype != cp.float32 for a in (x, h0, Wx, Wh, b)):
+        raise ValueError('rnn_forward_cuda only supports float32 arrays')
+    N, T, D = x.shape
+    H = h0.shape[1]
+    xw = cp.dot(x.reshape(N * T, D), Wx).reshape(N, T, H) + b
+    h = cp.empty((N, T, H), dtype=cp.float32)
+    block = 128
+    grid = ((H + block - 1) // block, N)
+    args = (xw, cp.ascontiguousarray(h0), cp.ascontiguousarray(Wh), h,
+            np.int32(N), np.int32(T), np.int32(H))
+    for t in range(T):
+        _rnn_step_forward_kernel(grid, (block,), args + (np.int32(t),),
+                                 shared_mem=H * 4)
+    cache = (x, h0, Wx, Wh, h)
+    return h, cache
+
+
+def _import_torch():
+    # torch takes about a second to import, so only load it once a cuDNN pass
+    # actually runs on the GPU.
+    try:
+        import torch
+    except ImportError:
+        raise ImportError('rnn_forward_cudnn requires torch; run "pip install torch"')
+    return torch
+
+
+def _on_gpu(a):
+    if type(a).__module__.startswith('torch'):
+        return a.is_cuda
+    return hasattr(a, '__cuda_array_interface__')
+
+
+def _rnn_forward_torch(x, h0, Wx, Wh, b, device):
+    torch = _import_torch()
+    params = [torch.as_tensor(a, device=device).detach().requires_grad_()
+              for a in (x, h0, Wx, Wh, b)]
+    x_t, h0_t, Wx_t, Wh_t, b_t = params
+    # cuDNN keeps separate input and hidden biases; ours goes into the first.
+    weights = [Wx_t.t().contiguous(), Wh_t.t().contiguous(), b_t,
+               torch.zeros_like(b_t)]
+    # The weights are new tensors on every call, so cuDNN has to copy them into
+    # one contiguous buffer each time. That costs one copy of the weights per
+    # call, small next to the recurrence, and torch warns about it every time.
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', 'RNN module weights are not part')
+        h, _ = torch._VF.rnn_tanh(x_t, h0_t.unsqueeze(0), weights, True, 1,
+                                  0.0, True, False, True)
+    return h, params
+
+
+def rnn_forward_cudnn(x, h0, Wx, Wh, b):
+    """
+    Run rnn_forward through cuDNN's fused RNN kernels when the inputs live on
+    the GPU, either as torch CUDA tensors or as arrays exposing
+    __cuda_array_interface__ such as cupy arrays. Other inputs fall back to
+    rnn_forward. Returns the hidden states, as a cupy array for cupy input and
+    as a torch tensor otherwise, and a cache for rnn_backward_cudnn.
+    """
+    if not _on_gpu(x):
+        h, cache = rnn_forward(x, h0, Wx, Wh, b)
+        return h, (False, cache)
+    h, params = _rnn_forward_torch(x, h0, Wx, Wh, b, 'cuda')
+    as_cupy = cp is not None and isinstance(x, cp.ndarray)
+    out = cp.asarray(h.detach()) if as_cupy else h.detach()
+    return out, (True, (h, params, as_cupy))
+
+
+def rnn_backward_cudnn(dh, cache):
+    """
+    Backward pass for a cache produced by rnn_forward_cudnn. Returns dx, dh0,
+    dWx, dWh and db like rnn_backward, on the same device as the inputs.
+    """
+    use_cudnn, cache = cache
+    if not use_cudnn:
+        return rnn_backward(dh, cache)
+    h, params, as_cupy = cache
+    torch = _import_torch()
+    dh = torch.as_tensor(dh, device=h.device, dtype=h.dtype)
+    grads = torch.autograd.grad(h, params, dh)
+    if as_cupy:
+        return tuple(cp.asarray(g) for g in grads)
+    return grads
@@ -32,7 +32,7 @@ def rnn_step_forward(x, prev_h, Wx, Wh, b):
     next_h = np.tanh(np.dot(x,Wx) +  np.dot(prev_h,Wh) + b)
     cache['x'] = x
     cache['prev_h'] = prev_h
-    cache['next_h'] = next_h
+    cache['dtanh_coef'] = 1 - next_h * next_h
     cache['Wh'] = Wh
     cache['Wx'] = Wx
     return next_h, cache
@@ -55,10 +55,9 @@ def rnn_step_backward(dnext_h, cache):
     """
     x = cache ['x']
     prev_h = cache ['prev_h']
-    next_h  = cache['next_h']
     Wh = cache['Wh']
     Wx = cache['Wx']
-    de_dz = dnext_h * (1 - next_h**2)
+    de_dz = dnext_h * cache['dtanh_coef']
     dWh = np.dot(np.transpose(prev_h),de_dz)
     dWx = np.dot(np.transpose(x),de_dz)
     dx = np.dot(de_dz,np.transpose(Wx))
@@ -70,6 +69,55 @@ def rnn_step_backward(dnext_h, cache):
     return dx, dprev_h, dWx, dWh, db
 
 
+def rnn_step_forward_pre(xw, prev_h, Wh, out=None, next_h=None):
+    """
+    Run the forward pass for a single timestep of a vanilla RNN whose input
+    projection x.dot(Wx) + b has already been computed for the whole sequence.
+
+    Inputs:
+    - xw: Projected input data for this timestep, of shape (N, H).
+    - prev_h: Hidden state from previous timestep, of shape (N, H)
+    - Wh: Weight matrix for hidden-to-hidden connections, of shape (H, H)
+    - out: Optional C-contiguous array of shape (N, H) and the dtype of
+      prev_h.dot(Wh), reused as scratch space for the pre-activation.
+    - next_h: Optional array of shape (N, H) that receives the next hidden
+      state, e.g. a slice of the hidden states of the whole sequence.
+
+    Returns:
+    - next_h: Next hidden state, of shape (N, H)
+
+    The derivative of the tanh needed by rnn_step_backward_pre is
+    1 - next_h**2.
+    """
+    a = np.dot(prev_h,Wh,out=out)
+    a += xw
+    return np.tanh(a, out=next_h)
+
+
+def rnn_step_backward_pre(dnext_h, dtanh_coef, Wh_T, dxw=None):
+    """
+    Backward pass for a single timestep of a vanilla RNN whose input projection
+    was precomputed, see rnn_step_forward_pre.
+
+    Inputs:
+    - dnext_h: Gradient of loss with respect to next hidden state
+    - dtanh_coef: Derivative of the tanh from the forward pass, of shape (N, H)
+    - Wh_T: Transpose of the hidden-to-hidden weights, of shape (H, H)
+    - dxw: Optional array of shape (N, H) that receives the gradient of the
+      projected input data.
+
+    Returns a tuple of:
+    - dxw: Gradients of the projected input data, of shape (N, H)
+    - dprev_h: Gradients of previous hidden state, of shape (N, H)
+
+    The gradient of the hidden-to-hidden weights is np.dot(prev_h.T, dxw); it is
+    left to the caller so that it can be accumulated over many timesteps at once.
+    """
+    dxw = np.multiply(dnext_h, dtanh_coef, out=dxw)
+    dprev_h = np.dot(dxw,Wh_T)
+    return dxw, dprev_h
+
+
 def bidirectional_rnn_concatenate_forward(h, hr, mask):
     """
     (Optional) Forward pass for concatenating hidden vectors obtained from a RNN 
@@ -94,13 +142,18 @@ def bidirectional_rnn_concatenate_forward(h, hr, mask):
     - cache: Tuple of values needed for the backward pass.
     """
     ho, cache = None, None
-    ##############################################################################
-    # TODO: Implement the forward pass for a single step of a bidirectional RNN. #
-    ##############################################################################
-    pass
-    ##############################################################################
-    #                               END OF YOUR CODE                             #
-    ##############################################################################
+    N, T, H = h.shape
+    # Position t of a sentence of length L is timestep L - 1 - t of the reversed
+    # RNN. Padding positions point at timestep 0 and are zeroed by the mask.
+    lengths = np.sum(mask, axis=1).astype(np.int64)
+    idx = lengths[:, None] - 1 - np.arange(T)[None, :]
+    idx = np.where(mask > 0, idx, 0)
+    rows = np.arange(N)[:, None]
+    ho = np.concatenate((h * mask[:, :, None],
+                         hr[rows, idx] * mask[:, :, None]), axis=2)
+    cache = {}
+    cache['mask'] = mask
+    cache['idx'] = idx
     return ho, cache
 
 
@@ -126,14 +179,13 @@ def bidirectional_rnn_concatenate_backward(dho, cache):
     - dh, dhr: Gradients of input data, of shape (N, T, H).
     """
     dh, dhr = None, None
-    ##############################################################################
-    # TODO: Implement the backward pass for a single step of the output layer of #
-    #       of a bidirectional RNN.                                              #
-    ##############################################################################
-    pass
-    ##############################################################################
-    #                               END OF YOUR CODE                             #
-    ##############################################################################
+    mask, idx = cache['mask'], cache['idx']
+    H = dho.shape[2] // 2
+    rows = np.arange(dho.shape[0])[:, None]
+    dh = dho[:, :, :H] * mask[:, :, None]
+    # Reversing a sentence is its own inverse, so scattering the gradient back
+    # to the reversed RNN is the same gather as in the forward pass.
+    dhr = dho[:, :, H:][rows, idx] * mask[:, :, None]
     return dh, dhr
 
 
@@ -144,6 +196,9 @@ def rnn_forward(x, h0, Wx, Wh, b):
     size of H, and we work over a minibatch containing N sequences. After running
     the RNN forward, we return the hidden states for all timesteps.
 
+    Mixed dtypes are promoted, so pass all inputs as float32 to run every matrix
+    multiply in single precision.
+
     Inputs:
     - x: Input data for the entire timeseries, of shape (N, T, D).
     - h0: Initial hidden state, of shape (N, H)
@@ -155,14 +210,38 @@ def rnn_forward(x, h0, Wx, Wh, b):
     - h: Hidden states for the entire timeseries, of shape (N, T, H).
     - cache: Values needed in the backward pass
     """
-    h, cache = [], []
-    prev_h = h0
-    for timestep in range(x.shape[1]):
-        h_current,cache_current = rnn_step_forward(x[:,timestep,:],prev_h,Wx,Wh,b)
-        prev_h = cache_current['next_h']
-        cache.append(cache_current)
-        h.append(h_current)
-    h = np.transpose(h,[1,0,2])
+    N, T, D = x.shape
+    H = h0.shape[1]
+    x = np.ascontiguousarray(x)
+    # The input projection does not depend on the recurrence, so compute it for
+    # all timesteps with a single matrix multiply.
+    xw = np.dot(x.reshape(N * T, D), Wx).reshape(N, T, H) + b
+    # Bring Wh and h0 to the common dtype once, so that the per-step
+    # prev_h.dot(Wh) goes straight to BLAS without converting or copying Wh,
+    # and reuse a single buffer for its result.
+    dtype = np.result_type(xw, h0, Wh)
+    Wh = np.ascontiguousarray(Wh, dtype=dtype)
+    h = np.empty((N, T, H), dtype=dtype)
+    hWh = np.empty((N, H), dtype=dtype)
+    prev_h = h0.astype(dtype, copy=False)
+    for timestep in range(T):
+        prev_h = rnn_step_forward_pre(xw[:,timestep,:], prev_h, Wh, hWh,
+                                      h[:,timestep,:])
+    # The tanh derivative only depends on the outputs, so it is computed for
+    # the whole sequence at once after the recurrence.
+    dtanh_coef = np.square(h)
+    np.subtract(1, dtanh_coef, out=dtanh_coef)
+    # The input hidden state of every step is copied out of h, so that callers
+    # may modify the returned h in place without corrupting dWh.
+    prev_h = np.concatenate((h0[:, None, :], h[:, :-1, :]), axis=1)
+    # Everything the backward pass needs is kept once for the whole sequence;
+    # the values of timestep t are slices along the second axis.
+    cache = {}
+    cache['x'] = x
+    cache['prev_h'] = prev_h
+    cache['dtanh_coef'] = dtanh_coef
+    cache['Wx'] = Wx
+    cache['Wh'] = Wh
     return h, cache
 
 
@@ -180,19 +259,27 @@ def rnn_backward(dh, cache):
     - dWh: Gradient of hidden-to-hidden weights, of shape (H, H)
     - db: Gradient of biases, of shape (H,)
     """
-    dx = []
-    for timestep in range(dh.shape[1]-1,-1,-1):
-        if timestep == dh.shape[1]-1 :
-            dx_current, dh0, dWx, dWh, db = rnn_step_backward(dh[:,timestep,:], cache[timestep])
-            dx.append(dx_current)
-        else:
-            dx_current, dh0, dWx_current, dWh_current, db_current = rnn_step_backward(dh[:,timestep,:] + dh0, cache[timestep])
-            dx.append(dx_current)
-            dWx += dWx_current
-            dWh += dWh_current
-            db += db_current
-    dx.reverse()
-    dx = np.transpose(dx,[1,0,2])
+    x, prev_h = cache['x'], cache['prev_h']
+    dtanh_coef, Wx, Wh = cache['dtanh_coef'], cache['Wx'], cache['Wh']
+    N, T, H = dh.shape
+    D = x.shape[2]
+    Wh_T = np.ascontiguousarray(Wh.T)
+    dtype = np.result_type(dh, dtanh_coef)
+    dxw = np.empty((N, T, H), dtype=dtype)
+    dh0 = np.zeros((N, H), dtype=dtype)
+    for timestep in range(T-1,-1,-1):
+        # dh0 is always a fresh array here, so the upstream gradient can be
+        # added in place and the step writes straight into dxw.
+        dh0 += dh[:,timestep,:]
+        _, dh0 = rnn_step_backward_pre(dh0, dtanh_coef[:,timestep,:], Wh_T,
+                                       dxw[:,timestep,:])
+    # Only the recurrence itself has to run step by step; the weight and input
+    # gradients are accumulated over all timesteps with one matrix multiply each.
+    dxw = dxw.reshape(N * T, H)
+    dx = np.dot(dxw, Wx.T).reshape(N, T, D)
+    dWx = np.dot(x.reshape(N * T, D).T, dxw)
+    dWh = np.dot(prev_h.reshape(N * T, H).T, dxw)
+    db = np.sum(dxw, axis = 0)
     return dx, dh0, dWx, dWh, db
 
 
@@ -211,12 +298,9 @@ def average_forward(hi, mask):
     - cache: Tuple of values needed for the backward pass.
     """
     ho, cache = None, None
-    N, T, H = hi.shape
     count = np.sum(mask, axis=1)
-    ho = []
-    for i in range(N):
-        ho.append(np.dot(mask[i], hi[i]) / count[i])
-    ho = np.array(ho)
+    # Masked sum over time as a stack of (1, T) x (T, H) matrix products.
+    ho = np.matmul(mask[:, None, :], hi)[:, 0, :] / count[:, None]
     cache = {}
     cache['mask'] = mask
     cache['count'] = count
@@ -234,15 +318,7 @@ def average_backward(dho, cache):
     Returns a tuple of:
     - dhi: Gradients of input data, of shape (M, N, H).
     """
-    N, H = dho.shape
-    T = cache['mask'].shape[1]
-    dhi = []
-    for i in range(N):
-        tmph = []
-        for j in range(T):
-            tmph.append(dho[i] * cache['mask'][i,j] / cache['count'][i])
-        dhi.append(tmph)
-    dhi = np.array(dhi)
+    dhi = (dho / cache['count'][:, None])[:, None, :] * cache['mask'][:, :, None]
     return dhi
 
 
@@ -264,7 +340,18 @@ def temporal_affine_forward(x, w, b):
     """
     N, T, D = x.shape
     M = b.shape[0]
-    out = x.reshape(N * T, D).dot(w).reshape(N, T, M) + b
+    # Reshaping only gives a view of a contiguous array; make the copy here,
+    # once, instead of letting both passes copy x on every reshape.
+    x = np.ascontiguousarray(x)
+    # Write the product straight into the output and add the bias in place, so
+    # that only one (N, T, M) array is allocated. The output dtype accounts for
+    # b as well, and np.dot can only write into an output of its own dtype.
+    out = np.empty((N, T, M), dtype=np.result_type(x, w, b))
+    if out.dtype == np.result_type(x, w):
+        np.dot(x.reshape(N * T, D), w, out=out.reshape(N * T, M))
+    else:
+        out.reshape(N * T, M)[...] = np.dot(x.reshape(N * T, D), w)
+    out += b
     cache = x, w, b, out
     return out, cache
 
@@ -286,8 +373,9 @@ def temporal_affine_backward(dout, cache):
     N, T, D = x.shape
     M = b.shape[0]
 
-    dx = dout.reshape(N * T, M).dot(w.T).reshape(N, T, D)
-    dw = dout.reshape(N * T, M).T.dot(x.reshape(N * T, D)).T
+    dx = np.empty((N, T, D), dtype=np.result_type(dout, w))
+    np.dot(dout.reshape(N * T, M), w.T, out=dx.reshape(N * T, D))
+    dw = x.reshape(N * T, D).T.dot(dout.reshape(N * T, M))
     db = dout.sum(axis=(0, 1))
 
     return dx, dw, db
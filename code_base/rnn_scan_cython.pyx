@@ -0,0 +1,64 @@
+# cython: boundscheck=False, wraparound=False, cdivision=True
+from cython cimport floating
+from libc.math cimport tanh, tanhf
+from libc.string cimport memcpy
+from scipy.linalg.cython_blas cimport sgemm, dgemm
+
+
+cdef inline void _tanh_rows(floating *a, int n_rows, int n_cols,
+                            int ld) noexcept nogil:
+    # Each row is contiguous, so with -ffast-math gcc turns the inner loop into
+    # calls to glibc's vectorized tanh (libmvec), see setup.py. Elsewhere it
+    # stays a scalar loop over libm's tanh, which is just as accurate.
+    cdef int i, j
+    cdef floating *row
+    for i in range(n_rows):
+        row = a + i * ld
+        for j in range(n_cols):
+            if floating is float:
+                row[j] = tanhf(row[j])
+            else:
+                row[j] = tanh(row[j])
+
+
+def rnn_scan_forward(const floating[:, :, ::1] xw, const floating[:, ::1] h0,
+                     const floating[:, ::1] Wh, floating[:, :, ::1] h):
+    """
+    Run the recurrence of a vanilla RNN whose input projection xw = x.dot(Wx) + b
+    has already been computed, writing h[:, t, :] = tanh(xw[:, t, :] +
+    h[:, t - 1, :].dot(Wh)) with h[:, -1, :] taken to be h0.
+
+    All arrays must be C-contiguous and share one dtype, float32 or float64; h
+    has the shape (N, T, H) of xw and is overwritten.
+    """
+    cdef int N = xw.shape[0]
+    cdef int T = xw.shape[1]
+    cdef int H = xw.shape[2]
+    cdef int ld_h = T * H
+    cdef int ld_prev = H
+    cdef int t, i
+    cdef char trans = b'N'
+    cdef floating one = 1
+    cdef floating *prev
+    cdef floating *out
+    if N == 0 or T == 0 or H == 0:
+        return
+    prev = <floating *> &h0[0, 0]
+    with nogil:
+        for t in range(T):
+            # Start from the projected input and let gemm add prev_h.dot(Wh).
+            # The arrays are row-major, so this computes the transposed product
+            # Wh.T.dot(prev_h.T) in BLAS's column-major convention, reading
+            # prev_h and writing the output with a leading dimension of T * H.
+            out = &h[0, t, 0]
+            for i in range(N):
+                memcpy(&h[i, t, 0], &xw[i, t, 0], H * sizeof(floating))
+            if floating is float:
+                sgemm(&trans, &trans, &H, &N, &H, &one, <float *> &Wh[0, 0], &H,
+                      prev, &ld_prev, &one, out, &ld_h)
+            else:
+                dgemm(&trans, &trans, &H, &N, &H, &one, <double *> &Wh[0, 0], &H,
+                      prev, &ld_prev, &one, out, &ld_h)
+            _tanh_rows(out, N, H, ld_h)
+            prev = out
+            ld_prev = ld_h
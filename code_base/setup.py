@@ -0,0 +1,26 @@
+import sys
+from setuptools import setup, Extension
+from Cython.Build import cythonize
+
+# Build the optional compiled kernels in place, from the code_base directory:
+#   pip install cython scipy
+#   python setup.py build_ext --inplace
+# Cython is only needed to build. scipy is also needed at run time, since the
+# kernels call BLAS through scipy.linalg.cython_blas.
+#
+# On Linux, -ffast-math lets gcc vectorize the tanh with glibc's libmvec, which
+# then has to be linked. The flag is only passed when compiling, so it does not
+# change the floating point mode of the Python process.
+compile_args, libraries = [], []
+if sys.platform.startswith('linux'):
+    compile_args, libraries = ['-O3', '-ffast-math'], ['mvec', 'm']
+
+extensions = [
+    Extension('rnn_scan_cython', ['rnn_scan_cython.pyx'],
+              extra_compile_args=compile_args, libraries=libraries),
+]
+
+setup(
+    ext_modules=cythonize(extensions),
+    install_requires=['numpy', 'scipy'],
+)